@@ -1,8 +1,12 @@
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+from discovery import discover
+from bulk_io import import_nodes, export_nodes
+import tracing
 from backend import (
     load_config, save_config, launch_node, get_node_status,
-    get_all_nodes, delete_node, node_logs
+    get_all_nodes, delete_node, node_logs, claim_config, release_config
 )
 
 class NodeManagerGUI:
@@ -11,6 +15,7 @@ class NodeManagerGUI:
         self.root.title("Multi-Node Modbus Dashboard")
         self.root.geometry("1100x600")
         
+        tracing.install_signal_handler()
         self.create_dashboard()
         self.load_existing_nodes()
         self.auto_refresh()
@@ -34,6 +39,42 @@ class NodeManagerGUI:
             width=15
         ).pack(side=tk.LEFT, padx=5)
         
+        tk.Button(
+            control_frame,
+            text="Discover Nodes",
+            command=self.open_discovery_window,
+            width=15
+        ).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(
+            control_frame,
+            text="Import Nodes",
+            command=self.import_nodes_file,
+            width=15
+        ).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(
+            control_frame,
+            text="Export Nodes",
+            command=self.export_nodes_file,
+            width=15
+        ).pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(
+            control_frame,
+            text="Dump Trace",
+            command=self.dump_trace,
+            width=15
+        ).pack(side=tk.RIGHT, padx=5)
+        
+        self.tracing_var = tk.BooleanVar(value=tracing.is_enabled())
+        tk.Checkbutton(
+            control_frame,
+            text="Tracing",
+            variable=self.tracing_var,
+            command=self.toggle_tracing
+        ).pack(side=tk.RIGHT, padx=5)
+        
         cols = ("NODE_ID", "IP:PORT", "SENSORS", "STATUS", "LOG", "SITE")
         self.tree = ttk.Treeview(
             self.root,
@@ -93,6 +134,7 @@ class NodeManagerGUI:
     def load_existing_nodes(self):
         """Load existing nodes from config file"""
         load_config()
+        claim_config()
         for node_id, cfg in get_all_nodes().items():
             launch_node(node_id, cfg)
         self.refresh_dashboard()
@@ -127,6 +169,7 @@ class NodeManagerGUI:
         sensor_frame.grid(row=4, column=1, sticky="nsew", padx=5, pady=5)
         
         sensor_cols = ("Type", "Name", "Slave ID", "Address", "Details")
+        self.pending_sensors = {}  # sensor_tree item -> sensor config
         self.sensor_tree = ttk.Treeview(
             sensor_frame,
             columns=sensor_cols,
@@ -213,13 +256,20 @@ class NodeManagerGUI:
                 if not name:
                     raise ValueError("Sensor name is required")
                 
-                self.sensor_tree.insert('', tk.END, values=(
+                item = self.sensor_tree.insert('', tk.END, values=(
                     "RES",
                     name,
                     slave_id,
                     f"0x{address:04X}",
                     f"Count: {count}"
                 ))
+                self.pending_sensors[item] = {
+                    'type': 'RES',
+                    'name': name,
+                    'slave_id': slave_id,
+                    'address': address,
+                    'count': count
+                }
                 win.destroy()
             except ValueError as e:
                 messagebox.showerror("Error", f"Invalid input: {str(e)}")
@@ -258,23 +308,213 @@ class NodeManagerGUI:
                 
                 name = f"NER_{slave_id}"
                 
-                self.sensor_tree.insert('', tk.END, values=(
+                item = self.sensor_tree.insert('', tk.END, values=(
                     "NER",
                     name,
                     slave_id,
                     f"0x{start_addr:04X}",
                     f"Pos: {ner_pos}, Count: {reg_count}"
                 ))
+                self.pending_sensors[item] = {
+                    'type': 'NER',
+                    'name': name,
+                    'slave_id': slave_id,
+                    'start_address': start_addr,
+                    'register_count': reg_count,
+                    'ner_position': ner_pos
+                }
                 win.destroy()
             except ValueError as e:
                 messagebox.showerror("Error", f"Invalid input: {str(e)}")
         
         tk.Button(win, text="Save", command=save_sensor).grid(row=4, column=0, columnspan=2, pady=5)
 
+    def toggle_tracing(self):
+        """Turn hot-path span recording on or off"""
+        if self.tracing_var.get():
+            tracing.enable()
+        else:
+            tracing.disable()
+
+    def dump_trace(self):
+        """Save recorded spans as a Chrome/Perfetto trace file"""
+        path = filedialog.asksaveasfilename(
+            parent=self.root,
+            title="Dump Trace",
+            defaultextension=".json",
+            filetypes=[("Chrome trace", "*.json")]
+        )
+        if not path:
+            return
+        
+        try:
+            tracing.dump(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Trace dump failed: {str(e)}", parent=self.root)
+
+    def import_nodes_file(self):
+        """Bulk import nodes from a CSV/JSON/JSONL file and start them in batches"""
+        path = filedialog.askopenfilename(
+            parent=self.root,
+            title="Import Nodes",
+            filetypes=[("Node files", "*.csv *.json *.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        try:
+            node_ids, errors = import_nodes(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Import failed: {str(e)}", parent=self.root)
+            return
+        
+        if errors:
+            shown = "\n".join(errors[:20])
+            more = f"\n... and {len(errors) - 20} more" if len(errors) > 20 else ""
+            messagebox.showerror("Import Rejected", f"No nodes were imported:\n{shown}{more}", parent=self.root)
+            return
+        
+        messagebox.showinfo("Import Complete", f"Imported {len(node_ids)} node(s)", parent=self.root)
+        self.refresh_dashboard()
+
+    def export_nodes_file(self):
+        """Export all nodes to a CSV/JSON/JSONL file"""
+        path = filedialog.asksaveasfilename(
+            parent=self.root,
+            title="Export Nodes",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON", "*.json"), ("JSON Lines", "*.jsonl")]
+        )
+        if not path:
+            return
+        
+        try:
+            export_nodes(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Export failed: {str(e)}", parent=self.root)
+
+    def open_discovery_window(self):
+        """Open window to scan a subnet for Modbus gateways and sensors"""
+        win = tk.Toplevel(self.root)
+        win.title("Discover Nodes")
+        win.geometry("700x400")
+        
+        fields = [
+            ("Subnet (CIDR):", 0, "192.168.1.0/24"),
+            ("Modbus Port:", 1, "502"),
+            ("Site:", 2, ""),
+            ("Slave IDs:", 3, "1-247")
+        ]
+        
+        entries = {}
+        for label, row, default in fields:
+            tk.Label(win, text=label).grid(row=row, column=0, sticky="e", padx=5, pady=2)
+            entry = tk.Entry(win)
+            entry.grid(row=row, column=1, sticky="we", padx=5, pady=2)
+            entry.insert(0, default)
+            entries[label] = entry
+        
+        result_cols = ("NODE_ID", "IP:PORT", "SENSORS")
+        result_tree = ttk.Treeview(win, columns=result_cols, show='headings', height=10)
+        for col, width in zip(result_cols, [150, 150, 350]):
+            result_tree.heading(col, text=col)
+            result_tree.column(col, width=width, anchor=tk.W)
+        result_tree.grid(row=5, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
+        
+        status_var = tk.StringVar(value="Idle")
+        tk.Label(win, textvariable=status_var).grid(row=6, column=0, columnspan=2, sticky="w", padx=5)
+        
+        proposals = {}
+        
+        def show_results(found, error=None):
+            if not win.winfo_exists():
+                return
+            scan_button.config(state=tk.NORMAL)
+            if error:
+                status_var.set("Scan failed")
+                messagebox.showerror("Error", error, parent=win)
+                return
+            
+            proposals.clear()
+            proposals.update(found)
+            for item in result_tree.get_children():
+                result_tree.delete(item)
+            for node_id, cfg in proposals.items():
+                result_tree.insert('', tk.END, iid=node_id, values=(
+                    node_id,
+                    f"{cfg['ip']}:{cfg['port']}",
+                    ", ".join(s['name'] for s in cfg['sensors'])
+                ))
+            status_var.set(f"Found {len(proposals)} new node(s)")
+        
+        def run_scan():
+            try:
+                port = int(entries["Modbus Port:"].get())
+                network = entries["Subnet (CIDR):"].get()
+                first_id, _, last_id = entries["Slave IDs:"].get().partition("-")
+                slave_ids = range(int(first_id), int(last_id or first_id) + 1)
+            except ValueError:
+                messagebox.showerror("Error", "Port and slave IDs (e.g. 1-247) must be numbers", parent=win)
+                return
+            
+            site = entries["Site:"].get()
+            existing = dict(get_all_nodes())
+            status_var.set(f"Scanning {network}...")
+            scan_button.config(state=tk.DISABLED)
+            
+            def worker():
+                # Tk calls (including winfo_exists) only happen in show_results on the Tk thread
+                try:
+                    found = discover(network, port, site, existing, slave_ids)
+                    error = None
+                except ValueError as e:
+                    found, error = {}, f"Invalid subnet: {str(e)}"
+                except Exception as e:
+                    found, error = {}, f"Discovery failed: {str(e)}"
+                self.root.after(0, lambda: show_results(found, error))
+            
+            threading.Thread(target=worker, daemon=True).start()
+        
+        def save_selected():
+            selection = result_tree.selection() or result_tree.get_children()
+            nodes_config = get_all_nodes()
+            added = []
+            for node_id in selection:
+                if node_id in proposals and node_id not in nodes_config:
+                    nodes_config[node_id] = proposals[node_id]
+                    added.append(node_id)
+            
+            if not added:
+                return
+            
+            save_config()
+            for node_id in added:
+                launch_node(node_id, nodes_config[node_id])
+            win.destroy()
+            self.refresh_dashboard()
+        
+        button_frame = tk.Frame(win)
+        button_frame.grid(row=4, column=0, columnspan=2, pady=5)
+        
+        scan_button = tk.Button(button_frame, text="Scan", command=run_scan, width=15)
+        scan_button.pack(side=tk.LEFT, padx=5)
+        
+        tk.Button(
+            button_frame,
+            text="Save & Start Selected",
+            command=save_selected,
+            width=20
+        ).pack(side=tk.LEFT, padx=5)
+        
+        win.grid_columnconfigure(1, weight=1)
+        win.grid_rowconfigure(5, weight=1)
+
     def remove_sensor(self):
         """Remove selected sensor from configuration"""
         selection = self.sensor_tree.selection()
         if selection:
+            for item in selection:
+                self.pending_sensors.pop(item, None)
             self.sensor_tree.delete(selection)
 
     def save_new_node(self, window, node_id, site, ip, port):
@@ -293,27 +533,7 @@ class NodeManagerGUI:
             messagebox.showerror("Error", "Port must be a number")
             return
             
-        sensors = []
-        for item in self.sensor_tree.get_children():
-            values = self.sensor_tree.item(item, 'values')
-            if values[0] == "RES":
-                sensors.append({
-                    'type': 'RES',
-                    'name': values[1],
-                    'slave_id': int(values[2]),
-                    'address': int(values[3], 16),
-                    'count': int(values[4].split(": ")[1])
-                })
-            elif values[0] == "NER":
-                details = values[4].split(", ")
-                sensors.append({
-                    'type': 'NER',
-                    'name': values[1],
-                    'slave_id': int(values[2]),
-                    'start_address': int(values[3], 16),
-                    'register_count': int(details[1].split(": ")[1]),
-                    'ner_position': int(details[0].split(": ")[1])
-                })
+        sensors = [self.pending_sensors[item] for item in self.sensor_tree.get_children()]
         
         if not sensors:
             messagebox.showerror("Error", "At least one sensor is required")
@@ -413,5 +633,6 @@ if __name__ == "__main__":
         gui = NodeManagerGUI(root)
         root.mainloop()
     finally:
+        release_config()
         from modbus_backend import cleanup
         cleanup()
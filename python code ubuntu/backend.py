@@ -5,11 +5,16 @@ import struct
 import os
 import random
 import base64
+import math
 from datetime import datetime
 from pymodbus.client import ModbusTcpClient
 import paho.mqtt.client as mqtt
+from tracing import span, TracedLock
+from capture import CaptureWriter, RecordingClient, ReplayClient, capture_path
+from scheduler import next_publish_time, upstream_budget, schedule_fleet, is_scheduled
 
 CONFIG_FILE = "nodes_config.json"
+CONFIG_OWNER_FILE = f"{CONFIG_FILE}.pid"   # PID of the dashboard holding nodes_config in memory
 
 # MQTT Configuration (can be moved to config file if needed)
 MQTT_BROKER = 'localhost'
@@ -17,17 +22,35 @@ MQTT_PORT = 1883
 MQTT_TOPIC = 'b25saW5lcmVzbW9uaXRvcg=='  # base64('onlineresmonitor')
 PUBLISH_INTERVAL = 5  # Seconds between MQTT publish cycles
 
+# Per-sensor last-value messages; set MODBUS_SENSOR_MESSAGES=0 to send only the stats record
+PUBLISH_SENSOR_MESSAGES = os.environ.get("MODBUS_SENSOR_MESSAGES", "1") != "0"
+BUDGET_WARN_FRACTION = 0.1  # Warn when a publish cycle waits this share of the interval for budget
+
+# Raw Modbus capture: when set, every node records its register responses here
+CAPTURE_DIR = os.environ.get("MODBUS_CAPTURE_DIR")
+
 # Global state
 nodes_config = {}       # NODE_ID -> {'ip', 'port', 'site', 'sensors': [...]}
 node_threads = {}       # NODE_ID -> {'modbus_thread', 'mqtt_thread', 'running'}
 node_logs = {}          # NODE_ID -> [log strings]
-node_values = {}        # NODE_ID -> {sensor_name: value}
-node_status = {}        # NODE_ID -> {sensor_name: status}
-lock = threading.Lock()
+node_plans = {}         # NODE_ID -> tuple of SensorPlan (index = value slot)
+node_values = {}        # NODE_ID -> [value per plan slot]
+node_status = {}        # NODE_ID -> [status per plan slot]
+node_stats = {}         # NODE_ID -> [SensorWindow per plan slot]
+lock = TracedLock("lock")
+
+# Order of the per-sensor values in the published stats record
+STATS_FIELDS = ("min", "max", "mean", "last", "count", "errors")
+
+_log_clock = (0, "")    # (epoch second, formatted '%H:%M:%S') reused within a second
 
 def log(msg, node_id=None, level="INFO"):
     """Enhanced logging function with timestamp and node context"""
-    timestamp = datetime.now().strftime('%H:%M:%S')
+    global _log_clock
+    second = int(time.time())
+    if second != _log_clock[0]:
+        _log_clock = (second, datetime.fromtimestamp(second).strftime('%H:%M:%S'))
+    timestamp = _log_clock[1]
     node_context = f"[NODE {node_id}] " if node_id else ""
     log_line = f"[{timestamp}] [{level}] {node_context}{msg}"
     print(log_line)
@@ -38,10 +61,27 @@ def log(msg, node_id=None, level="INFO"):
         node_logs[node_id].append(log_line)
         node_logs[node_id] = node_logs[node_id][-300:]  # Keep last 300 logs
 
+def init_capture_dir():
+    """Create CAPTURE_DIR at start-up; capture is switched off if that fails"""
+    global CAPTURE_DIR
+    if not CAPTURE_DIR:
+        return
+    try:
+        os.makedirs(CAPTURE_DIR, exist_ok=True)
+    except OSError as e:
+        log(f"Capture disabled, cannot create {CAPTURE_DIR}: {str(e)}", level="WARNING")
+        CAPTURE_DIR = None
+
+init_capture_dir()
+
 def save_config():
-    """Save configuration to file"""
-    with open(CONFIG_FILE, "w") as f:
+    """Save configuration to file atomically (write temp file, then replace)"""
+    tmp_file = f"{CONFIG_FILE}.tmp"
+    with open(tmp_file, "w") as f:
         json.dump(nodes_config, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, CONFIG_FILE)
 
 def load_config():
     """Load configuration from file"""
@@ -52,50 +92,198 @@ def load_config():
     else:
         nodes_config = {}
 
+def claim_config():
+    """Record this process as the dashboard that owns nodes_config"""
+    with open(CONFIG_OWNER_FILE, "w") as f:
+        f.write(str(os.getpid()))
+
+def release_config():
+    """Remove the owner record if this process wrote it"""
+    if config_owner() == os.getpid():
+        os.remove(CONFIG_OWNER_FILE)
+
+def config_owner():
+    """PID of the running dashboard that owns nodes_config, or None"""
+    try:
+        with open(CONFIG_OWNER_FILE) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None     # Stale record left by a dashboard that did not exit cleanly
+    except PermissionError:
+        pass
+    return pid
+
+class SensorWindow:
+    """Running statistics of one sensor for the current publish window"""
+    __slots__ = ("min", "max", "total", "last", "count", "errors")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.min = None
+        self.max = None
+        self.total = 0.0
+        self.last = None
+        self.count = 0
+        self.errors = 0
+
+    def add(self, value):
+        if not math.isfinite(value):
+            # NaN/inf would stick in min/max and is not valid JSON for the consumer
+            self.errors += 1
+            return
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if self.count == 0 or value > self.max:
+            self.max = value
+        self.total += value
+        self.last = value
+        self.count += 1
+
+    def add_error(self):
+        self.errors += 1
+
+    def summary(self):
+        """Return [min, max, mean, last, count, errors] in STATS_FIELDS order"""
+        mean = round(self.total / self.count, 4) if self.count else None
+        return [self.min, self.max, mean, self.last, self.count, self.errors]
+
+def take_window_stats(node_id):
+    """Return the stats of every sensor of a node and start a new window (call with lock held)"""
+    stats = {}
+    for plan, window in zip(node_plans.get(node_id, ()), node_stats.get(node_id, ())):
+        stats[plan.name] = window.summary()
+        window.reset()
+    return stats
+
+def init_node_state(node_id, sensors):
+    """Compile read plans for a node and allocate its value slots (call with lock held)"""
+    plans = compile_plans(sensors)
+    node_plans[node_id] = plans
+    node_values[node_id] = [0.0] * len(plans)
+    node_status[node_id] = ['INIT'] * len(plans)
+    node_stats[node_id] = [SensorWindow() for _ in plans]
+    return plans
+
+def node_state(node_id):
+    """Return the (values, status, stats) slot lists of a node"""
+    return node_values[node_id], node_status[node_id], node_stats[node_id]
+
+def record_reading(state, plan, value, node_id):
+    """Store one poll result in its value slot (call with lock held)"""
+    values, status, stats = state
+    if value is not None and math.isfinite(value):
+        values[plan.index] = value
+        status[plan.index] = 'OK'
+        stats[plan.index].add(value)
+        log(plan.log_format % value, node_id)
+        return True
+    status[plan.index] = 'ERROR'
+    stats[plan.index].add_error()
+    return False
+
+def build_messages(node_id, node_config, window):
+    """Build one publish cycle of MQTT messages (call with lock held)"""
+    msgs = [{'initialStart': 1}]
+    values = node_values[node_id]
+    
+    for plan in node_plans[node_id] if PUBLISH_SENSOR_MESSAGES else ():
+        msgs.append({
+            plan.name: values[plan.index],
+            'alarm': 0,
+            'start': 1
+        })
+        log(f"Publishing {plan.name} = {values[plan.index]}", node_id)
+    
+    # One compact summary of every reading taken since the last cycle
+    msgs.append({
+        'stats': take_window_stats(node_id),
+        'fields': STATS_FIELDS,
+        'window': round(window, 1)
+    })
+    
+    msgs.append({'end': 1})
+    return msgs
+
+def encode_message(node_id, msg):
+    """Wrap a message in the base64 envelope expected by the consumer"""
+    encoded = base64.b64encode(json.dumps(msg).encode()).decode()
+    return json.dumps({"Node_Id": node_id, "data": encoded})
+
+_WORDS = struct.Struct('>HH')
+_FLOAT = struct.Struct('>f')
+
 def decode_ner_float(high_reg, low_reg):
     """Decode NER float value from two registers (CDAB format)"""
-    byte_data = bytes([
-        (low_reg >> 8) & 0xFF,
-        low_reg & 0xFF,
-        (high_reg >> 8) & 0xFF,
-        high_reg & 0xFF
-    ])
-    return struct.unpack('>f', byte_data)[0]
+    return _FLOAT.unpack(_WORDS.pack(low_reg & 0xFFFF, high_reg & 0xFFFF))[0]
 
-def read_sensor(client, sensor, node_id):
-    """Read sensor value with robust error handling"""
+def _decode_res(registers, pos):
+    return registers[0]
+
+def _decode_ner(registers, pos):
+    return _FLOAT.unpack(_WORDS.pack(registers[pos + 1], registers[pos]))[0]
+
+class SensorPlan:
+    """Immutable, pre-resolved read of one sensor, built once when a node starts"""
+    __slots__ = ("index", "name", "slave_id", "address", "count", "pos",
+                 "min_len", "decode", "log_format", "error_msg")
+
+    def __init__(self, index, sensor):
+        set_slot = object.__setattr__
+        set_slot(self, "index", index)
+        set_slot(self, "name", sensor['name'])
+        set_slot(self, "slave_id", sensor['slave_id'])
+        name = sensor['name'].replace('%', '%%')   # Names are free text; keep them literal in the format
+        if sensor['type'] == 'NER':
+            pos = sensor.get('ner_position', 2)
+            set_slot(self, "address", sensor['start_address'])
+            set_slot(self, "count", sensor['register_count'])
+            set_slot(self, "pos", pos)
+            set_slot(self, "min_len", pos + 2)
+            set_slot(self, "decode", _decode_ner)
+            set_slot(self, "log_format", f"{name} = %.4f")
+        else:
+            set_slot(self, "address", sensor['address'])
+            set_slot(self, "count", sensor['count'])
+            set_slot(self, "pos", 0)
+            set_slot(self, "min_len", 1)
+            set_slot(self, "decode", _decode_res)
+            set_slot(self, "log_format", f"{name} = %s")
+        set_slot(self, "error_msg", f"Modbus error reading {sensor['name']}")
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SensorPlan is immutable")
+
+def compile_plans(sensors):
+    """Compile a node's sensor configs into read plans; plan.index is the value slot"""
+    return tuple(SensorPlan(index, sensor) for index, sensor in enumerate(sensors))
+
+def read_plan(client, plan, node_id):
+    """Execute a compiled read plan, returning the decoded value or None"""
     try:
-        if sensor['type'] == 'RES':
-            response = client.read_holding_registers(
-                address=sensor['address'],
-                count=sensor['count'],
-                slave=sensor['slave_id']
-            )
-            if not response.isError():
-                return response.registers[0]
-            else:
-                log(f"Modbus error reading {sensor['name']}", node_id, "WARNING")
-        
-        elif sensor['type'] == 'NER':
-            response = client.read_holding_registers(
-                address=sensor['start_address'],
-                count=sensor['register_count'],
-                slave=sensor['slave_id']
-            )
-            if not response.isError() and len(response.registers) >= (sensor.get('ner_position', 2) + 2):
-                return decode_ner_float(
-                    response.registers[sensor.get('ner_position', 2)],
-                    response.registers[sensor.get('ner_position', 2) + 1]
-                )
-            else:
-                log(f"Modbus error reading {sensor['name']}", node_id, "WARNING")
-        
+        response = client.read_holding_registers(
+            address=plan.address,
+            count=plan.count,
+            slave=plan.slave_id
+        )
+        if not response.isError() and len(response.registers) >= plan.min_len:
+            return plan.decode(response.registers, plan.pos)
+        log(plan.error_msg, node_id, "WARNING")
         return None
         
     except Exception as e:
-        log(f"Read error for {sensor['name']}: {str(e)}", node_id, "ERROR")
+        log(f"Read error for {plan.name}: {str(e)}", node_id, "ERROR")
         return None
 
+def read_sensor(client, sensor, node_id):
+    """Read one sensor from its config dict (one-off reads; the poll loop uses compiled plans)"""
+    return read_plan(client, SensorPlan(0, sensor), node_id)
+
 def on_mqtt_connect(client, userdata, flags, rc, properties=None):
     """MQTT connection callback"""
     if rc == 0:
@@ -112,35 +300,39 @@ def mqtt_publisher(node_id, node_config):
     try:
         client.connect(MQTT_BROKER, MQTT_PORT)
         client.loop_start()
+        window_start = time.time()
         
         while node_threads[node_id]['running']:
             try:
+                # Wait for this node's slot so the fleet's publishes are spread over the interval
+                with span("sleep.schedule"):
+                    time.sleep(max(0, next_publish_time(node_id, PUBLISH_INTERVAL) - time.time()))
+                if not node_threads[node_id]['running']:
+                    break
+                
                 with lock:
-                    # Prepare MQTT messages
-                    msgs = [{'initialStart': 1}]
-                    
-                    for sensor in node_config['sensors']:
-                        msgs.append({
-                            sensor['name']: node_values[node_id].get(sensor['name'], 0),
-                            'alarm': 0,
-                            'start': 1
-                        })
-                        log(f"Publishing {sensor['name']} = {node_values[node_id].get(sensor['name'], 0)}", node_id)
-                    
-                    msgs.append({'end': 1})
+                    now = time.time()
+                    msgs = build_messages(node_id, node_config, now - window_start)
+                    window_start = now
                 
                 # Publish all messages
+                budget_wait = 0.0
                 for msg in msgs:
                     try:
-                        encoded = base64.b64encode(json.dumps(msg).encode()).decode()
-                        payload = json.dumps({"Node_Id": node_id, "data": encoded})
-                        client.publish(MQTT_TOPIC, payload)
-                        time.sleep(0.1)  # Small delay between messages
+                        with span("encode"):
+                            payload = encode_message(node_id, msg)
+                        with span("budget.wait"):
+                            budget_wait += upstream_budget.acquire(len(payload))
+                        with span("mqtt.publish", node_id):
+                            client.publish(MQTT_TOPIC, payload)
+                        with span("sleep.publish"):
+                            time.sleep(0.1)  # Small delay between messages
                     except Exception as e:
                         log(f"Publish error: {str(e)}", node_id, "ERROR")
                 
+                if budget_wait > BUDGET_WARN_FRACTION * PUBLISH_INTERVAL:
+                    log(f"Publish cycle waited {budget_wait:.1f}s for the upstream budget", node_id, "WARNING")
                 log("Publish cycle complete", node_id)
-                time.sleep(PUBLISH_INTERVAL)
                 
             except Exception as e:
                 log(f"Publisher error: {str(e)}", node_id, "ERROR")
@@ -158,30 +350,65 @@ def start_node_worker(node_id, cfg):
     
     # Initialize node state
     with lock:
-        node_values[node_id] = {s['name']: 0.0 for s in sensors}
-        node_status[node_id] = {s['name']: 'INIT' for s in sensors}
+        plans = init_node_state(node_id, sensors)
+        state = node_state(node_id)
     
     # Timing configuration
     INTER_SENSOR_DELAY = 0.5
     MODBUS_TIMEOUT = 3.0
     POLL_INTERVAL = 2
     RECONNECT_DELAY = 4
+    
+    # Replay transport: serve recorded responses instead of talking to the device
+    replay = cfg.get('replay')
+    replay_client = None
+    if replay:
+        replay_client = ReplayClient(
+            replay['path'],
+            realtime=replay.get('realtime', True),
+            poll_keys=[(p.slave_id, p.address, p.count) for p in plans]
+        )
+        if not replay.get('realtime', True):
+            INTER_SENSOR_DELAY = POLL_INTERVAL = RECONNECT_DELAY = 0
+    
+    def open_client():
+        """Create the Modbus transport for one connection attempt"""
+        if replay_client:
+            client = replay_client
+        else:
+            client = ModbusTcpClient(
+                host=ip,
+                port=int(port),
+                timeout=MODBUS_TIMEOUT,
+                retries=1,
+            )
+        if CAPTURE_DIR and not replay_client:
+            # Capture is diagnostics only: never let it stop the node polling
+            try:
+                writer = CaptureWriter(capture_path(CAPTURE_DIR, node_id), node_id, cfg)
+            except OSError as e:
+                log(f"Capture not recorded: {str(e)}", node_id, "WARNING")
+                return client
+            return RecordingClient(client, writer)
+        return client
 
     def modbus_loop():
         """Modbus polling loop"""
         while node_threads[node_id]['running']:
+            if replay_client and replay_client.exhausted:
+                log("Replay finished", node_id)
+                replay_client.close()
+                return
             try:
-                with ModbusTcpClient(
-                    host=ip,
-                    port=int(port),
-                    timeout=MODBUS_TIMEOUT,
-                    retries=1,
-                ) as client:
+                with open_client() as client:
                     
                     log(f"Attempting to connect to {ip}:{port}", node_id)
                     connection_start = time.time()
                     
-                    if not client.connect():
+                    with span("modbus.connect", f"{ip}:{port}"):
+                        connected = client.connect()
+                    
+                    if not connected:
                         log(f"Connection failed after {time.time()-connection_start:.1f}s", node_id, "WARNING")
                         time.sleep(RECONNECT_DELAY)
                         continue
@@ -192,7 +419,7 @@ def start_node_worker(node_id, cfg):
                         cycle_start = time.time()
                         all_success = True
                         
-                        for sensor in sensors:
+                        for plan in plans:
                             if not node_threads[node_id]['running']:
                                 break
                                 
@@ -202,21 +429,17 @@ def start_node_worker(node_id, cfg):
                                 log("Connection lost, reconnecting...", node_id, "WARNING")
                                 break
                             
-                            value = read_sensor(client, sensor, node_id)
+                            with span("read_sensor", plan.name):
+                                value = read_plan(client, plan, node_id)
                             
                             with lock:
-                                if value is not None:
-                                    node_values[node_id][sensor['name']] = value
-                                    node_status[node_id][sensor['name']] = 'OK'
-                                    log_msg = f"{sensor['name']} = {value:.4f}" if sensor['type'] == 'NER' else f"{sensor['name']} = {value}"
-                                    log(log_msg, node_id)
-                                else:
-                                    node_status[node_id][sensor['name']] = 'ERROR'
+                                if not record_reading(state, plan, value, node_id):
                                     all_success = False
                             
                             elapsed = time.time() - sensor_start
                             remaining_delay = max(0, INTER_SENSOR_DELAY - elapsed)
-                            time.sleep(remaining_delay)
+                            with span("sleep.inter_sensor"):
+                                time.sleep(remaining_delay)
                         
                         if not client.is_socket_open():
                             break
@@ -236,8 +459,8 @@ def start_node_worker(node_id, cfg):
                 time.sleep(RECONNECT_DELAY)
 
     # Start worker threads
-    modbus_thread = threading.Thread(target=modbus_loop, daemon=True)
-    mqtt_thread = threading.Thread(target=mqtt_publisher, args=(node_id, cfg), daemon=True)
+    modbus_thread = threading.Thread(target=modbus_loop, name=f"modbus-{node_id}", daemon=True)
+    mqtt_thread = threading.Thread(target=mqtt_publisher, args=(node_id, cfg), name=f"mqtt-{node_id}", daemon=True)
     
     modbus_thread.start()
     mqtt_thread.start()
@@ -252,6 +475,8 @@ def launch_node(node_id, cfg):
         return
         
     try:
+        if not is_scheduled(node_id, nodes_config):
+            schedule_fleet(nodes_config, PUBLISH_INTERVAL, PUBLISH_SENSOR_MESSAGES)
         start_node_worker(node_id, cfg)
         log(f"Launched node {node_id}")
     except Exception as e:
@@ -280,8 +505,9 @@ def delete_node(node_id):
     if node_id in nodes_config:
         del nodes_config[node_id]
         save_config()
+        schedule_fleet(nodes_config, PUBLISH_INTERVAL, PUBLISH_SENSOR_MESSAGES)
     
-    for data in [node_logs, node_values, node_status]:
+    for data in [node_logs, node_plans, node_values, node_status, node_stats]:
         if node_id in data:
             del data[node_id]
     
@@ -0,0 +1,113 @@
+import contextlib
+import io
+import struct
+import time
+from datetime import datetime
+from backend import (
+    lock, SensorWindow, decode_ner_float, init_node_state, node_state, read_plan, record_reading
+)
+
+# Microbenchmark: per-reading CPU of the poll hot path, dict dispatch vs compiled plans.
+# Both paths include the per-reading log line, which is most of the cost.
+READINGS = 200000
+SENSORS = [
+    {'type': 'NER', 'name': 'NER_1', 'slave_id': 1, 'start_address': 0, 'register_count': 20, 'ner_position': 2},
+    {'type': 'RES', 'name': 'RES_2', 'slave_id': 2, 'address': 1, 'count': 1},
+]
+
+def dict_log(msg, node_id, logs, level="INFO"):
+    """log() before plans: strftime on every call"""
+    timestamp = datetime.now().strftime('%H:%M:%S')
+    log_line = f"[{timestamp}] [{level}] [NODE {node_id}] {msg}"
+    print(log_line)
+    if node_id not in logs:
+        logs[node_id] = []
+    logs[node_id].append(log_line)
+    logs[node_id] = logs[node_id][-300:]
+
+class FakeResponse:
+    __slots__ = ("registers",)
+
+    def __init__(self, registers):
+        self.registers = registers
+
+    def isError(self):
+        return False
+
+class FakeClient:
+    """Returns canned responses so only the gateway's own work is measured"""
+
+    def __init__(self):
+        high, low = struct.unpack('>HH', struct.pack('>f', 12.5))
+        self.ner = FakeResponse([0, 0, low, high] + [0] * 16)
+        self.res = FakeResponse([1234])
+
+    def read_holding_registers(self, address, count, slave):
+        return self.ner if count == 20 else self.res
+
+def dict_reading(client, sensor, node_id, values, status, stats, logs):
+    """The per-reading path before plans: string dispatch and name-keyed dicts"""
+    if sensor['type'] == 'RES':
+        response = client.read_holding_registers(
+            address=sensor['address'], count=sensor['count'], slave=sensor['slave_id'])
+        value = response.registers[0] if not response.isError() else None
+    else:
+        response = client.read_holding_registers(
+            address=sensor['start_address'], count=sensor['register_count'], slave=sensor['slave_id'])
+        if not response.isError() and len(response.registers) >= (sensor.get('ner_position', 2) + 2):
+            value = decode_ner_float(
+                response.registers[sensor.get('ner_position', 2)],
+                response.registers[sensor.get('ner_position', 2) + 1]
+            )
+        else:
+            value = None
+    with lock:
+        if value is not None:
+            values[node_id][sensor['name']] = value
+            status[node_id][sensor['name']] = 'OK'
+            stats[node_id][sensor['name']].add(value)
+            log_msg = f"{sensor['name']} = {value:.4f}" if sensor['type'] == 'NER' else f"{sensor['name']} = {value}"
+            dict_log(log_msg, node_id, logs)
+
+def run(label, step):
+    start = time.process_time()
+    for i in range(READINGS // len(SENSORS)):
+        step()
+    per_reading = (time.process_time() - start) / READINGS * 1e6
+    return label, per_reading
+
+def main():
+    client = FakeClient()
+    node_id = "BENCH"
+
+    values = {node_id: {s['name']: 0.0 for s in SENSORS}}
+    status = {node_id: {s['name']: 'INIT' for s in SENSORS}}
+    stats = {node_id: {s['name']: SensorWindow() for s in SENSORS}}
+    logs = {}
+
+    def dict_step():
+        for sensor in SENSORS:
+            dict_reading(client, sensor, node_id, values, status, stats, logs)
+
+    with lock:
+        plans = init_node_state(node_id, SENSORS)
+        state = node_state(node_id)
+
+    def plan_step():
+        for plan in plans:
+            value = read_plan(client, plan, node_id)
+            with lock:
+                record_reading(state, plan, value, node_id)
+
+    results = []
+    with contextlib.redirect_stdout(io.StringIO()) as sink:
+        for label, step in (("dict dispatch", dict_step), ("compiled plans", plan_step)):
+            results.append(run(label, step))
+            sink.seek(0)
+            sink.truncate()
+
+    for label, per_reading in results:
+        print(f"{label:>15}: {per_reading:.2f} us CPU per reading")
+
+if __name__ == "__main__":
+    main()
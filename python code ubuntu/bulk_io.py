@@ -0,0 +1,373 @@
+import argparse
+import csv
+import ipaddress
+import json
+import os
+import threading
+import time
+from backend import log, load_config, save_config, launch_node, get_all_nodes, config_owner
+
+# CSV layout: one row per sensor, node fields repeated on every row
+CSV_FIELDS = ["node_id", "site", "ip", "port", "type", "name",
+              "slave_id", "address", "count", "ner_position"]
+
+# Integer fields per sensor type, as stored in nodes_config
+INT_FIELDS = {
+    'RES': ('slave_id', 'address', 'count'),
+    'NER': ('slave_id', 'start_address', 'register_count', 'ner_position'),
+}
+
+# Controlled start-up of imported nodes
+BATCH_SIZE = 50       # Nodes launched per batch
+BATCH_DELAY = 2.0     # Seconds between batches
+
+def _sensor_to_row(node_id, cfg, sensor):
+    """Flatten one sensor of a node into a CSV row"""
+    row = {
+        'node_id': node_id,
+        'site': cfg.get('site', ''),
+        'ip': cfg['ip'],
+        'port': cfg['port'],
+        'type': sensor['type'],
+        'name': sensor['name'],
+        'slave_id': sensor['slave_id'],
+    }
+    if sensor['type'] == 'NER':
+        row['address'] = sensor['start_address']
+        row['count'] = sensor['register_count']
+        row['ner_position'] = sensor.get('ner_position', 2)
+    else:
+        row['address'] = sensor['address']
+        row['count'] = sensor['count']
+        row['ner_position'] = ''
+    return row
+
+def _parse_int(value, field):
+    """Parse decimal or 0x-prefixed integers from import files"""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(str(value).strip(), 0)
+    except ValueError:
+        raise ValueError(f"invalid {field} '{value}'")
+
+def _row_to_sensor(row):
+    """Build a sensor config entry from a CSV row"""
+    sensor_type = (row.get('type') or '').strip().upper()
+    name = (row.get('name') or '').strip()
+    slave_id = _parse_int(row.get('slave_id'), 'slave_id')
+    address = _parse_int(row.get('address'), 'address')
+    count = _parse_int(row.get('count'), 'count')
+
+    if sensor_type == 'RES':
+        return {
+            'type': 'RES',
+            'name': name,
+            'slave_id': slave_id,
+            'address': address,
+            'count': count
+        }
+    elif sensor_type == 'NER':
+        ner_position = row.get('ner_position')
+        return {
+            'type': 'NER',
+            'name': name or f"NER_{slave_id}",
+            'slave_id': slave_id,
+            'start_address': address,
+            'register_count': count,
+            'ner_position': _parse_int(ner_position, 'ner_position') if ner_position not in (None, '') else 2
+        }
+    raise ValueError(f"unknown sensor type '{sensor_type}'")
+
+def iter_csv_nodes(path):
+    """Stream (line, node_id, cfg) tuples from a CSV file, one per sensor row"""
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            line = reader.line_num
+            try:
+                node_id = (row.get('node_id') or '').strip()
+                cfg = {
+                    'ip': (row.get('ip') or '').strip(),
+                    'port': row.get('port'),
+                    'site': (row.get('site') or '').strip(),
+                    'sensors': [_row_to_sensor(row)]
+                }
+            except ValueError as e:
+                yield line, None, str(e)
+                continue
+            yield line, node_id, cfg
+
+def iter_json_nodes(path):
+    """Yield (line, node_id, cfg) tuples from JSON Lines or a nodes_config JSON file.
+
+    JSON Lines is streamed; a .json file is loaded whole, like nodes_config.json.
+    """
+    with open(path) as f:
+        if path.lower().endswith('.json'):
+            # Same layout as nodes_config.json
+            try:
+                nodes = json.load(f)
+            except ValueError as e:
+                yield 1, None, f"invalid JSON: {str(e)}"
+                return
+            if not isinstance(nodes, dict):
+                yield 1, None, "expected an object mapping node IDs to node configs"
+                return
+            for index, (node_id, cfg) in enumerate(nodes.items(), 1):
+                yield index, node_id, cfg
+            return
+
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+                node_id = record.pop('node_id')
+            except (ValueError, KeyError, AttributeError) as e:
+                yield line, None, f"invalid record: {str(e)}"
+                continue
+            yield line, node_id, record
+
+def iter_import_file(path):
+    """Pick the reader for an import file based on its extension"""
+    if path.lower().endswith('.csv'):
+        return iter_csv_nodes(path)
+    return iter_json_nodes(path)
+
+def _validate_node(node_id, cfg):
+    """Check node-level fields and return the normalised config"""
+    if not node_id:
+        raise ValueError("node_id is required")
+    try:
+        # ip_address() also accepts integers, which ModbusTcpClient cannot use
+        if not isinstance(cfg.get('ip'), str):
+            raise ValueError
+        ipaddress.ip_address(cfg['ip'])
+    except ValueError:
+        raise ValueError(f"invalid IP address '{cfg.get('ip', '')}'")
+    port = _parse_int(cfg.get('port'), 'port')
+    if not 1 <= port <= 65535:
+        raise ValueError(f"port {port} out of range")
+    if not cfg.get('sensors'):
+        raise ValueError("at least one sensor is required")
+
+    sensors = []
+    for sensor in cfg['sensors']:
+        if sensor.get('type') not in ('RES', 'NER'):
+            raise ValueError(f"unknown sensor type '{sensor.get('type')}'")
+        if not sensor.get('name'):
+            raise ValueError("sensor name is required")
+        sensor = dict(sensor)
+        for field in INT_FIELDS[sensor['type']]:
+            if field in sensor:
+                sensor[field] = _parse_int(sensor[field], field)
+            elif field != 'ner_position':
+                raise ValueError(f"{sensor['name']}: missing {field}")
+        if not 1 <= sensor['slave_id'] <= 247:
+            raise ValueError(f"slave ID {sensor['slave_id']} out of range")
+        sensors.append(sensor)
+
+    return {
+        'ip': cfg['ip'],
+        'port': port,
+        'site': cfg.get('site', ''),
+        'sensors': sensors
+    }
+
+def _register_span(sensor):
+    """Return (slave_id, first, last) registers read by a sensor"""
+    if sensor['type'] == 'NER':
+        start, count = sensor['start_address'], sensor['register_count']
+        if count < sensor.get('ner_position', 2) + 2:
+            raise ValueError(f"{sensor['name']}: register count too small for NER position")
+    else:
+        start, count = sensor['address'], sensor['count']
+    if start < 0 or not 1 <= count <= 125:
+        raise ValueError(f"{sensor['name']}: invalid register range {start}+{count}")
+    return sensor['slave_id'], start, start + count - 1
+
+def load_import_file(path, existing=None):
+    """Stream and validate an import file.
+
+    Returns (nodes, errors). nodes maps node_id to a ready-to-save config;
+    errors is a list of "line N: message" strings and is empty on success.
+    """
+    existing = existing if existing is not None else get_all_nodes()
+    nodes = {}
+    sources = {}    # node_id -> first line it appeared on
+    errors = []
+    is_csv = path.lower().endswith('.csv')
+
+    for line, node_id, cfg in iter_import_file(path):
+        if node_id is None:
+            errors.append(f"line {line}: {cfg}")
+            continue
+        try:
+            cfg = _validate_node(node_id, cfg)
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append(f"line {line}: {str(e)}")
+            continue
+
+        if node_id in existing:
+            errors.append(f"line {line}: node ID {node_id} already exists")
+            continue
+
+        if node_id in nodes:
+            current = nodes[node_id]
+            if not is_csv:
+                errors.append(f"line {line}: duplicate node ID {node_id} (first on line {sources[node_id]})")
+            elif (current['ip'], current['port'], current['site']) != (cfg['ip'], cfg['port'], cfg['site']):
+                errors.append(f"line {line}: node {node_id} conflicts with line {sources[node_id]}")
+            else:
+                current['sensors'].extend(cfg['sensors'])
+            continue
+
+        nodes[node_id] = cfg
+        sources[node_id] = line
+
+    # Register overlap and sensor name checks across imported and existing nodes
+    spans = {}      # (ip, port, slave_id) -> [(first, last, owner)]
+    for node_id, cfg in list(existing.items()) + list(nodes.items()):
+        names = set()
+        for sensor in cfg['sensors']:
+            if node_id in nodes:
+                if sensor['name'] in names:
+                    errors.append(f"line {sources[node_id]}: duplicate sensor name {sensor['name']} in node {node_id}")
+                names.add(sensor['name'])
+            try:
+                slave_id, first, last = _register_span(sensor)
+            except (KeyError, TypeError, ValueError) as e:
+                if node_id in nodes:
+                    errors.append(f"line {sources[node_id]}: {str(e)}")
+                continue
+            key = (cfg['ip'], int(cfg['port']), slave_id)
+            spans.setdefault(key, []).append((first, last, node_id, sensor['name']))
+
+    for (ip, port, slave_id), ranges in spans.items():
+        ranges.sort()
+        # Compare each range with the furthest-reaching one seen so far: anything
+        # starting before that end overlaps it, even if ranges in between do not
+        widest = ranges[0]
+        for cur in ranges[1:]:
+            if cur[0] <= widest[1] and (cur[2] in nodes or widest[2] in nodes):
+                owner = cur[2] if cur[2] in nodes else widest[2]
+                errors.append(
+                    f"line {sources[owner]}: {cur[2]}/{cur[3]} overlaps {widest[2]}/{widest[3]} "
+                    f"on {ip}:{port} slave {slave_id}"
+                )
+            if cur[1] > widest[1]:
+                widest = cur
+
+    return nodes, errors
+
+def merge_nodes(nodes):
+    """Merge validated nodes into nodes_config with a single atomic write"""
+    nodes_config = get_all_nodes()
+    nodes_config.update(nodes)
+    try:
+        save_config()
+    except Exception:
+        for node_id in nodes:
+            nodes_config.pop(node_id, None)
+        raise
+    log(f"Imported {len(nodes)} node(s)")
+
+def launch_nodes_in_batches(node_ids, batch_size=BATCH_SIZE, batch_delay=BATCH_DELAY):
+    """Start nodes in batches from a background thread"""
+    node_ids = list(node_ids)
+
+    def run():
+        nodes_config = get_all_nodes()
+        for i in range(0, len(node_ids), batch_size):
+            for node_id in node_ids[i:i + batch_size]:
+                if node_id in nodes_config:
+                    launch_node(node_id, nodes_config[node_id])
+            log(f"Started batch of {len(node_ids[i:i + batch_size])} node(s)")
+            if i + batch_size < len(node_ids):
+                time.sleep(batch_delay)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def import_nodes(path, start=True):
+    """Validate, merge and optionally start all nodes from an import file.
+
+    Nothing is merged if any row fails validation. Returns (node_ids, errors).
+    """
+    start_time = time.time()
+    nodes, errors = load_import_file(path)
+    if errors:
+        log(f"Import of {path} rejected with {len(errors)} error(s)", level="WARNING")
+        return [], errors
+
+    merge_nodes(nodes)
+    log(f"Import of {path} finished in {time.time()-start_time:.1f}s")
+    if start:
+        launch_nodes_in_batches(nodes)
+    return list(nodes), []
+
+def export_nodes(path, nodes=None):
+    """Stream nodes to CSV (one row per sensor), JSON Lines or nodes_config JSON"""
+    nodes = nodes if nodes is not None else get_all_nodes()
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "w", newline='') as f:
+        if path.lower().endswith('.csv'):
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for node_id, cfg in nodes.items():
+                for sensor in cfg['sensors']:
+                    writer.writerow(_sensor_to_row(node_id, cfg, sensor))
+        elif path.lower().endswith('.jsonl'):
+            for node_id, cfg in nodes.items():
+                f.write(json.dumps({'node_id': node_id, **cfg}) + "\n")
+        else:
+            json.dump(nodes, f, indent=2)
+    os.replace(tmp_file, path)
+    log(f"Exported {len(nodes)} node(s) to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of node configurations")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = sub.add_parser(
+        "import",
+        help="Validate and merge nodes from CSV/JSON/JSONL",
+        description="Validate and merge nodes into nodes_config.json. Refused while the dashboard "
+                    "is running, since it would overwrite the file with its own copy; use its "
+                    "Import Nodes button instead. The dashboard starts the nodes on its next launch."
+    )
+    import_parser.add_argument("path")
+    import_parser.add_argument("--dry-run", action="store_true", help="Validate only, do not write")
+
+    export_parser = sub.add_parser("export", help="Export nodes to CSV/JSON/JSONL")
+    export_parser.add_argument("path")
+
+    args = parser.parse_args()
+    load_config()
+
+    if args.command == "export":
+        export_nodes(args.path)
+        return 0
+
+    if args.dry_run:
+        nodes, errors = load_import_file(args.path)
+    else:
+        # A running dashboard keeps nodes_config in memory and its next save
+        # would drop the imported nodes; they are started on its next launch
+        owner = config_owner()
+        if owner is not None:
+            print(f"Dashboard (PID {owner}) is running; close it or use its Import Nodes button")
+            return 1
+        nodes, errors = import_nodes(args.path, start=False)
+
+    for error in errors:
+        print(error)
+    if errors:
+        return 1
+    print(f"{len(nodes)} node(s) {'valid' if args.dry_run else 'imported'}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,198 @@
+import json
+import os
+import struct
+import time
+from collections import deque
+from datetime import datetime
+
+# Capture file layout:
+#   header:  MAGIC, uint32 length, JSON {'node_id', 'config'}
+#   records: RECORD (timestamp, slave_id, address, count, status, n) + n uint16 registers
+MAGIC = b"MBCAP1"
+HEADER_LEN = struct.Struct("<I")
+RECORD = struct.Struct("<dBHHBH")
+
+STATUS_OK = 0          # Registers returned
+STATUS_ERROR = 1       # Modbus exception response
+STATUS_EXCEPTION = 2   # Transport error raised by the client
+
+def capture_path(capture_dir, node_id):
+    """Capture file used for a node inside capture_dir"""
+    return os.path.join(capture_dir, f"{node_id}.mbcap")
+
+def _archive(path):
+    """Move an existing capture aside as <name>_<timestamp>.mbcap"""
+    base, ext = os.path.splitext(path)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    archived = f"{base}_{stamp}{ext}"
+    suffix = 1
+    while os.path.exists(archived):
+        archived = f"{base}_{stamp}_{suffix}{ext}"
+        suffix += 1
+    os.replace(path, archived)
+    return archived
+
+class CaptureWriter:
+    """Append raw register responses of one node to a capture file.
+
+    If the file was recorded with a different node config, it is archived
+    with a timestamp suffix and a new file is started, so the header always
+    describes the sensors in the records that follow it.
+    """
+
+    def __init__(self, path, node_id, config):
+        header = json.dumps({'node_id': node_id, 'config': config}).encode()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            try:
+                with open(path, "rb") as f:
+                    same = read_header(f) == (node_id, json.loads(header)['config'])
+            except (ValueError, KeyError, struct.error):
+                same = False
+            if not same:
+                _archive(path)
+
+        new_file = not os.path.exists(path)
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.write(MAGIC + HEADER_LEN.pack(len(header)) + header)
+
+    def write(self, slave_id, address, count, status, registers=()):
+        self.file.write(RECORD.pack(time.time(), slave_id, address, count, status, len(registers)))
+        if registers:
+            self.file.write(struct.pack(f"<{len(registers)}H", *registers))
+
+    def close(self):
+        self.file.close()
+
+def read_header(f):
+    """Read the capture header and return (node_id, config)"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a Modbus capture file")
+    (length,) = HEADER_LEN.unpack(f.read(HEADER_LEN.size))
+    header = json.loads(f.read(length))
+    return header['node_id'], header['config']
+
+def iter_records(f):
+    """Stream (timestamp, slave_id, address, count, status, registers) tuples"""
+    while True:
+        chunk = f.read(RECORD.size)
+        if len(chunk) < RECORD.size:
+            return
+        timestamp, slave_id, address, count, status, n = RECORD.unpack(chunk)
+        registers = list(struct.unpack(f"<{n}H", f.read(2 * n))) if n else []
+        yield timestamp, slave_id, address, count, status, registers
+
+class RecordingClient:
+    """Wrap a Modbus client and log every read_holding_registers response"""
+
+    def __init__(self, client, writer):
+        self.client = client
+        self.writer = writer
+
+    def __enter__(self):
+        self.client.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.writer.close()
+        return self.client.__exit__(exc_type, exc, tb)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def read_holding_registers(self, address, count, slave):
+        try:
+            response = self.client.read_holding_registers(address=address, count=count, slave=slave)
+        except Exception:
+            self.writer.write(slave, address, count, STATUS_EXCEPTION)
+            raise
+        if response.isError():
+            self.writer.write(slave, address, count, STATUS_ERROR)
+        else:
+            self.writer.write(slave, address, count, STATUS_OK, response.registers)
+        return response
+
+class ReplayResponse:
+    """Minimal stand-in for a pymodbus register response"""
+    __slots__ = ("registers", "error")
+
+    def __init__(self, registers, error=False):
+        self.registers = registers
+        self.error = error
+
+    def isError(self):
+        return self.error
+
+class ReplayClient:
+    """Modbus client stand-in that serves responses from a capture file.
+
+    Requests are matched to recorded responses by (slave_id, address, count),
+    in recorded order. With realtime=True responses are paced by their
+    original timestamps; otherwise they are returned as fast as possible.
+    `clock` holds the recorded timestamp of the last response served.
+    poll_keys lists the (slave_id, address, count) reads the caller will
+    make; the replay ends when none of them has recorded responses left,
+    even if the file still holds responses for sensors no longer polled.
+    """
+
+    def __init__(self, path, realtime=True, poll_keys=None):
+        self.file = open(path, "rb")
+        self.node_id, self.config = read_header(self.file)
+        self.records = iter_records(self.file)
+        self.pending = {}       # (slave_id, address, count) -> deque of unmatched records
+        self.poll_keys = set(poll_keys) if poll_keys is not None else None
+        self.realtime = realtime
+        self.exhausted = False
+        self.clock = None
+        self.first_timestamp = None
+        self.replay_start = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def connect(self):
+        return not self.exhausted
+
+    def is_socket_open(self):
+        return not self.exhausted
+
+    def close(self):
+        self.file.close()
+
+    def _next_record(self, key):
+        queue = self.pending.get(key)
+        if queue:
+            return queue.popleft()
+        for record in self.records:
+            if record[1:4] == key:
+                return record
+            self.pending.setdefault(record[1:4], deque()).append(record)
+        # A key missing from the capture only fails that read; the replay ends
+        # once no recorded responses are left for any key being polled
+        keys = self.poll_keys if self.poll_keys is not None else self.pending
+        self.exhausted = not any(self.pending.get(k) for k in keys)
+        return None
+
+    def read_holding_registers(self, address, count, slave):
+        record = self._next_record((slave, address, count))
+        if record is None:
+            if self.exhausted:
+                raise ConnectionError("replay finished")
+            return ReplayResponse([], True)
+
+        timestamp, _, _, _, status, registers = record
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+            self.replay_start = time.time()
+        if self.realtime:
+            delay = (timestamp - self.first_timestamp) - (time.time() - self.replay_start)
+            if delay > 0:
+                time.sleep(delay)
+        self.clock = timestamp
+
+        if status == STATUS_EXCEPTION:
+            raise ConnectionError("recorded transport error")
+        return ReplayResponse(registers, status == STATUS_ERROR)
@@ -0,0 +1,191 @@
+import ipaddress
+import math
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from pymodbus.client import ModbusTcpClient
+from backend import log, decode_ner_float
+
+# Scan configuration
+DEFAULT_PORT = 502
+CONNECT_TIMEOUT = 0.3      # Seconds per TCP connect probe
+SCAN_WORKERS = 256         # Concurrent connect probes across the subnet
+SCAN_BUDGET = 10.0         # Overall time budget for a subnet scan
+SLAVE_TIMEOUT = 0.25       # Seconds per Modbus probe request on an idle bus
+SLAVE_LANES = 1            # Connections per gateway; the RTU bus behind it serves one request at a time
+SLAVE_IDS = range(1, 248)  # Valid Modbus unit IDs
+
+# Known register maps, matching the defaults in the Add RES/NER sensor dialogs
+RES_MAP = {'address': 1, 'count': 1}
+NER_MAP = {'start_address': 0, 'register_count': 20, 'ner_position': 2}
+
+# Magnitude a NER float must fall in. Small integers in the NER slots (typical
+# of RES registers) put zero in the exponent bits and decode far below this.
+NER_MIN_ABS = 1e-3
+NER_MAX_ABS = 1e6
+
+def probe_port(ip, port=DEFAULT_PORT, timeout=CONNECT_TIMEOUT):
+    """Return True if a TCP connection to ip:port succeeds"""
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def scan_subnet(network, port=DEFAULT_PORT, timeout=CONNECT_TIMEOUT,
+                workers=SCAN_WORKERS, budget=SCAN_BUDGET):
+    """Scan an IP range (CIDR string) concurrently and return hosts with the port open"""
+    hosts = [str(h) for h in ipaddress.ip_network(network, strict=False).hosts()]
+    found = []
+    start = time.time()
+
+    log(f"Scanning {len(hosts)} hosts in {network} for port {port}")
+    pool = ThreadPoolExecutor(max_workers=min(workers, max(1, len(hosts))))
+    try:
+        futures = {pool.submit(probe_port, ip, port, timeout): ip for ip in hosts}
+        try:
+            for future in as_completed(futures, timeout=budget):
+                if future.result():
+                    found.append(futures[future])
+        except TimeoutError:
+            log(f"Subnet scan budget of {budget:.1f}s exhausted", level="WARNING")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    found.sort(key=ipaddress.ip_address)
+    log(f"Found {len(found)} gateway(s) in {time.time()-start:.1f}s")
+    return found
+
+def is_plausible_ner(registers):
+    """True if the NER slots hold a non-zero float in the expected magnitude range"""
+    pos = NER_MAP['ner_position']
+    if len(registers) < pos + 2:
+        return False
+    value = decode_ner_float(registers[pos], registers[pos + 1])
+    return math.isfinite(value) and NER_MIN_ABS <= abs(value) <= NER_MAX_ABS
+
+def classify_slave(client, slave_id):
+    """Probe known register maps and return a sensor entry, or None if no device answers.
+
+    A timeout on the first probe means nothing is at this ID, so the second
+    probe is skipped. A 20-register reply only counts as NER when its float
+    slots decode to a plausible value; anything else that answers at the
+    RES address is proposed as RES.
+    """
+    try:
+        response = client.read_holding_registers(
+            address=NER_MAP['start_address'],
+            count=NER_MAP['register_count'],
+            slave=slave_id
+        )
+    except Exception:
+        return None
+    if response.isError() and getattr(response, 'exception_code', None) is None:
+        return None     # No reply at all (timeout), as opposed to a Modbus exception response
+
+    try:
+        if not response.isError() and is_plausible_ner(response.registers):
+            return {
+                'type': 'NER',
+                'name': f"NER_{slave_id}",
+                'slave_id': slave_id,
+                **NER_MAP
+            }
+
+        response = client.read_holding_registers(
+            address=RES_MAP['address'],
+            count=RES_MAP['count'],
+            slave=slave_id
+        )
+        if not response.isError():
+            return {
+                'type': 'RES',
+                'name': f"RES_{slave_id}",
+                'slave_id': slave_id,
+                **RES_MAP
+            }
+    except Exception:
+        pass
+    return None
+
+def _sweep_lane(ip, port, slave_ids, timeout):
+    """Probe a share of the slave IDs over one dedicated connection"""
+    sensors = []
+    with ModbusTcpClient(host=ip, port=int(port), timeout=timeout, retries=0) as client:
+        if not client.connect():
+            return sensors
+        for slave_id in slave_ids:
+            sensor = classify_slave(client, slave_id)
+            if sensor:
+                sensors.append(sensor)
+    return sensors
+
+def sweep_slaves(ip, port=DEFAULT_PORT, slave_ids=SLAVE_IDS,
+                 timeout=SLAVE_TIMEOUT, lanes=SLAVE_LANES):
+    """Sweep slave IDs behind a gateway.
+
+    A serial gateway forwards one request at a time, so the default is a
+    single connection. With lanes > 1 requests queue inside the gateway, so
+    the per-request timeout is scaled by the lane count to keep present
+    devices from timing out. Each absent ID costs one timeout, so a full
+    1-247 sweep of an empty bus takes about a minute; narrow slave_ids
+    where the address range is known.
+    """
+    slave_ids = list(slave_ids)
+    lanes = max(1, min(lanes, len(slave_ids)))
+    timeout = timeout * lanes
+    sensors = []
+
+    with ThreadPoolExecutor(max_workers=lanes) as pool:
+        futures = [
+            pool.submit(_sweep_lane, ip, port, slave_ids[i::lanes], timeout)
+            for i in range(lanes)
+        ]
+        for future in futures:
+            try:
+                sensors.extend(future.result())
+            except Exception as e:
+                log(f"Slave sweep error on {ip}:{port}: {str(e)}", level="ERROR")
+
+    sensors.sort(key=lambda s: s['slave_id'])
+    log(f"{ip}:{port} answered on {len(sensors)} slave ID(s)")
+    return sensors
+
+def propose_nodes(gateways, port=DEFAULT_PORT, site="", existing=None):
+    """Build ready-to-save nodes_config entries from {ip: [sensors]}"""
+    existing = existing or {}
+    proposals = {}
+    for ip, sensors in gateways.items():
+        if not sensors:
+            continue
+        node_id = f"NODE_{ip.replace('.', '_')}"
+        if node_id in existing or any(
+            cfg['ip'] == ip and int(cfg['port']) == int(port) for cfg in existing.values()
+        ):
+            continue
+        proposals[node_id] = {
+            'ip': ip,
+            'port': int(port),
+            'site': site,
+            'sensors': sensors
+        }
+    return proposals
+
+def discover(network, port=DEFAULT_PORT, site="", existing=None,
+             slave_ids=SLAVE_IDS, gateway_workers=16):
+    """Scan a subnet, sweep every gateway found and return proposed node entries"""
+    start = time.time()
+    gateways = scan_subnet(network, port)
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(gateway_workers, len(gateways) or 1))) as pool:
+        futures = {pool.submit(sweep_slaves, ip, port, slave_ids): ip for ip in gateways}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                log(f"Discovery error on {futures[future]}: {str(e)}", level="ERROR")
+
+    proposals = propose_nodes(results, port, site, existing)
+    log(f"Discovery of {network} finished in {time.time()-start:.1f}s, {len(proposals)} node(s) proposed")
+    return proposals
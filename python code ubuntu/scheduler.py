@@ -0,0 +1,113 @@
+import threading
+import time
+import zlib
+
+# Gateway-wide upstream budget shared by every node's publisher. The
+# configured rates are a floor; schedule_fleet raises them to BUDGET_HEADROOM
+# times the fleet's steady demand so the budget trims bursts, not the average.
+MAX_MESSAGES_PER_SEC = 200        # Minimum sustained MQTT messages per second (0 = unlimited)
+MAX_BYTES_PER_SEC = 256 * 1024    # Minimum sustained payload bytes per second (0 = unlimited)
+BURST_SECONDS = 1.0               # Bucket size, in seconds of sustained rate
+BUDGET_HEADROOM = 1.5             # Budget over steady fleet demand
+BYTES_PER_MESSAGE = 160           # Envelope + base64 size estimate of one message
+STATS_BYTES_PER_SENSOR = 80       # Extra bytes per sensor in the stats record
+
+_slots = {}                       # NODE_ID -> rank among the scheduled node IDs
+
+def schedule_fleet(nodes, interval, sensor_messages=True):
+    """Give every node an evenly spaced slot and size the upstream budget for the fleet.
+
+    nodes is nodes_config. Slots follow the sorted node IDs, so they are
+    deterministic for a given fleet and shift only when nodes are added or
+    removed.
+    """
+    global _slots
+    _slots = {node_id: rank for rank, node_id in enumerate(sorted(nodes))}
+
+    messages = payload_bytes = 0
+    for cfg in nodes.values():
+        sensors = len(cfg['sensors'])
+        per_cycle = 3 + (sensors if sensor_messages else 0)   # initialStart, stats, end
+        messages += per_cycle
+        payload_bytes += per_cycle * BYTES_PER_MESSAGE + sensors * STATS_BYTES_PER_SENSOR
+
+    if MAX_MESSAGES_PER_SEC:
+        upstream_budget.messages.resize(max(MAX_MESSAGES_PER_SEC, BUDGET_HEADROOM * messages / interval))
+    if MAX_BYTES_PER_SEC:
+        upstream_budget.bytes.resize(max(MAX_BYTES_PER_SEC, BUDGET_HEADROOM * payload_bytes / interval))
+
+def is_scheduled(node_id, nodes):
+    """True if node_id has a slot from the current fleet"""
+    return node_id in _slots and len(_slots) == len(nodes)
+
+def publish_phase(node_id, interval):
+    """Offset of a node inside the publish interval: rank / fleet size * interval.
+
+    Nodes outside the scheduled fleet fall back to a crc32 of their ID, which
+    is deterministic but only statistically even.
+    """
+    rank = _slots.get(node_id)
+    if rank is None:
+        return (zlib.crc32(str(node_id).encode()) / 0x100000000) * interval
+    return rank / len(_slots) * interval
+
+def next_publish_time(node_id, interval, now=None):
+    """Next wall-clock time in the node's slot: phase + k * interval, strictly after now.
+
+    Slots are anchored to the epoch, so a restarted node falls straight back
+    into the same place in the cycle instead of bunching up with the others.
+    """
+    now = time.time() if now is None else now
+    phase = publish_phase(node_id, interval)
+    cycles = (now - phase) // interval + 1
+    return phase + cycles * interval
+
+class TokenBucket:
+    """Token bucket that lets callers take tokens on credit and tells them how long to wait"""
+
+    def __init__(self, rate, burst_seconds):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self.capacity = rate * burst_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def resize(self, rate):
+        """Change the sustained rate, keeping the burst length in seconds"""
+        with self.lock:
+            now = time.monotonic()
+            if self.rate:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = rate
+            self.capacity = rate * self.burst_seconds
+            self.tokens = min(self.tokens, self.capacity)
+
+    def reserve(self, amount):
+        """Take amount tokens and return the seconds to wait before using them"""
+        if not self.rate:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+class UpstreamBudget:
+    """Message and byte budget for everything the gateway sends to the broker"""
+
+    def __init__(self, messages_per_sec=MAX_MESSAGES_PER_SEC, bytes_per_sec=MAX_BYTES_PER_SEC,
+                 burst_seconds=BURST_SECONDS):
+        self.messages = TokenBucket(messages_per_sec, burst_seconds)
+        self.bytes = TokenBucket(bytes_per_sec, burst_seconds)
+
+    def acquire(self, nbytes):
+        """Block until one message of nbytes fits in the budget; returns the time waited"""
+        delay = max(self.messages.reserve(1), self.bytes.reserve(nbytes))
+        if delay:
+            time.sleep(delay)
+        return delay
+
+upstream_budget = UpstreamBudget()
@@ -0,0 +1,68 @@
+import csv
+import json
+from bulk_io import CSV_FIELDS, load_import_file
+
+def write_csv(path, rows):
+    with open(path, "w", newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({'site': '', 'ip': '10.0.0.1', 'port': 502, 'type': 'RES',
+                             'slave_id': 1, 'ner_position': '', **row})
+
+def test_overlap_hidden_behind_a_shorter_range_is_reported(tmp_path):
+    path = tmp_path / "nodes.csv"
+    write_csv(path, [
+        {'node_id': 'A', 'name': 'a', 'address': 0, 'count': 100},
+        {'node_id': 'B', 'name': 'b', 'address': 10, 'count': 5},
+        {'node_id': 'C', 'name': 'c', 'address': 30, 'count': 5},
+    ])
+    nodes, errors = load_import_file(str(path), existing={})
+    assert len(errors) == 2
+    assert any("B/b overlaps A/a" in e for e in errors)
+    assert any("C/c overlaps A/a" in e for e in errors)
+
+def test_adjacent_ranges_and_other_slaves_are_accepted(tmp_path):
+    path = tmp_path / "nodes.csv"
+    write_csv(path, [
+        {'node_id': 'A', 'name': 'a', 'address': 0, 'count': 10},
+        {'node_id': 'B', 'name': 'b', 'address': 10, 'count': 10},
+        {'node_id': 'C', 'name': 'c', 'address': 0, 'count': 10, 'slave_id': 2},
+    ])
+    nodes, errors = load_import_file(str(path), existing={})
+    assert errors == []
+    assert sorted(nodes) == ['A', 'B', 'C']
+
+def test_overlap_with_existing_node_is_reported(tmp_path):
+    path = tmp_path / "nodes.csv"
+    write_csv(path, [{'node_id': 'B', 'name': 'b', 'address': 5, 'count': 1}])
+    existing = {'A': {'ip': '10.0.0.1', 'port': 502, 'site': '', 'sensors': [
+        {'type': 'RES', 'name': 'a', 'slave_id': 1, 'address': 0, 'count': 10}]}}
+    nodes, errors = load_import_file(str(path), existing=existing)
+    assert errors == ["line 2: B/b overlaps A/a on 10.0.0.1:502 slave 1"]
+
+def test_duplicate_ids_and_bad_ports_are_rejected(tmp_path):
+    path = tmp_path / "nodes.jsonl"
+    sensor = {'type': 'RES', 'name': 'r', 'slave_id': 1, 'address': 0, 'count': 1}
+    with open(path, "w") as f:
+        f.write(json.dumps({'node_id': 'A', 'ip': '10.0.0.1', 'port': 502, 'sensors': [sensor]}) + "\n")
+        f.write(json.dumps({'node_id': 'A', 'ip': '10.0.0.2', 'port': 502, 'sensors': [sensor]}) + "\n")
+        f.write(json.dumps({'node_id': 'B', 'ip': '10.0.0.3', 'port': 70000, 'sensors': [sensor]}) + "\n")
+    nodes, errors = load_import_file(str(path), existing={})
+    assert errors == [
+        "line 2: duplicate node ID A (first on line 1)",
+        "line 3: port 70000 out of range",
+    ]
+
+def test_json_that_is_not_a_node_map_and_integer_ips_are_rejected(tmp_path):
+    path = tmp_path / "nodes.json"
+    path.write_text("[1, 2]")
+    nodes, errors = load_import_file(str(path), existing={})
+    assert errors == ["line 1: expected an object mapping node IDs to node configs"]
+
+    sensor = {'type': 'RES', 'name': 'r', 'slave_id': 1, 'address': 0, 'count': 1}
+    path.write_text(json.dumps({'A': {'ip': 167772161, 'port': 502, 'sensors': [sensor]}, 'B': 5}))
+    nodes, errors = load_import_file(str(path), existing={})
+    assert nodes == {}
+    assert errors[0] == "line 1: invalid IP address '167772161'"
+    assert len(errors) == 2
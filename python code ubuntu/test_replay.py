@@ -0,0 +1,96 @@
+import base64
+import json
+import os
+import struct
+from capture import CaptureWriter, RecordingClient, read_header
+from replay import replay_pipeline
+
+NER = {'type': 'NER', 'name': 'NER_1', 'slave_id': 1, 'start_address': 0, 'register_count': 20, 'ner_position': 2}
+RES = {'type': 'RES', 'name': 'RES_2', 'slave_id': 2, 'address': 1, 'count': 1}
+CONFIG = {'ip': '10.0.0.1', 'port': 502, 'site': '', 'sensors': [NER, RES]}
+
+class FakeResponse:
+    def __init__(self, registers, error=False):
+        self.registers = registers
+        self.error = error
+
+    def isError(self):
+        return self.error
+
+class FakeClient:
+    """Device stand-in: NER counts up 1.0, 2.0, ...; RES fails every third read"""
+
+    def __init__(self):
+        self.reads = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def read_holding_registers(self, address, count, slave):
+        self.reads += 1
+        if slave == 1:
+            high, low = struct.unpack('>HH', struct.pack('>f', float(self.reads)))
+            return FakeResponse([0, 0, low, high] + [0] * 16)
+        if self.reads % 3 == 0:
+            return FakeResponse([], True)
+        return FakeResponse([100 + self.reads])
+
+def record(path, config, cycles):
+    sensors = config['sensors']
+    with RecordingClient(FakeClient(), CaptureWriter(str(path), "N1", config)) as client:
+        for _ in range(cycles):
+            for sensor in sensors:
+                key = 'start_address' if sensor['type'] == 'NER' else 'address'
+                count = 'register_count' if sensor['type'] == 'NER' else 'count'
+                client.read_holding_registers(address=sensor[key], count=sensor[count], slave=sensor['slave_id'])
+
+def decode(payload):
+    return json.loads(base64.b64decode(json.loads(payload)['data']))
+
+def stats_record(payloads):
+    return next(msg for msg in map(decode, payloads) if 'stats' in msg)['stats']
+
+def test_replay_is_deterministic_and_decodes_recorded_values(tmp_path):
+    path = tmp_path / "N1.mbcap"
+    record(path, CONFIG, cycles=10)
+
+    first, summary = replay_pipeline(str(path))
+    second, _ = replay_pipeline(str(path))
+
+    assert first == second
+    assert summary['readings'] == 20
+    stats = stats_record(first)
+    # NER reads are 1, 3, 5, ... 19 (every other read of the fake device)
+    assert stats['NER_1'][:2] == [1.0, 19.0]
+    assert stats['NER_1'][4:] == [10, 0]
+    assert stats['RES_2'][4] + stats['RES_2'][5] == 10
+    assert stats['RES_2'][5] == 3
+
+def test_config_change_starts_new_capture_and_replay_runs_to_the_end(tmp_path):
+    path = tmp_path / "N1.mbcap"
+    record(path, CONFIG, cycles=5)
+    reduced = dict(CONFIG, sensors=[RES])
+    record(path, reduced, cycles=5)
+
+    archived = [name for name in os.listdir(tmp_path) if name != "N1.mbcap"]
+    assert len(archived) == 1
+    with open(path, "rb") as f:
+        assert read_header(f) == ("N1", reduced)
+
+    # Replaying the old capture with a sensor missing from it still serves every recorded read
+    payloads, summary = replay_pipeline(str(tmp_path / archived[0]), node_config=dict(CONFIG, sensors=[
+        {**RES, 'name': 'RES_9', 'slave_id': 9}, NER]))
+    assert stats_record(payloads)['NER_1'][4] == 5
+
+def test_percent_sign_in_sensor_name_is_logged_literally(tmp_path, capsys):
+    path = tmp_path / "N1.mbcap"
+    record(path, CONFIG, cycles=2)
+
+    payloads, summary = replay_pipeline(str(path), node_config=dict(CONFIG, sensors=[
+        {**NER, 'name': 'Load 50%'}, RES]))
+    assert summary['readings'] == 4
+    assert stats_record(payloads)['Load 50%'][4] == 2
+    assert "Load 50% = 1.0000" in capsys.readouterr().out
@@ -0,0 +1,169 @@
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+# Tracing configuration
+TRACE_BUFFER_SIZE = int(os.environ.get("MODBUS_TRACE_BUFFER", "2048"))  # Spans kept per thread (ring buffer)
+TRACE_SIGNAL = getattr(signal, "SIGUSR1", None)
+
+_enabled = os.environ.get("MODBUS_TRACE") == "1"
+_origin = time.perf_counter_ns()
+_local = threading.local()
+_buffers = []               # _ThreadBuffer of every thread that recorded spans, for dump()
+_buffers_lock = threading.Lock()
+
+class _ThreadBuffer:
+    """Preallocated ring buffer of (name, start_ns, duration_ns, detail) spans for one thread"""
+    __slots__ = ("thread", "tid", "thread_name", "events", "index", "wrapped")
+
+    def __init__(self):
+        thread = threading.current_thread()
+        self.thread = thread
+        self.tid = thread.ident
+        self.thread_name = thread.name
+        self.events = [None] * TRACE_BUFFER_SIZE
+        self.index = 0
+        self.wrapped = False
+
+    def clear(self):
+        self.index = 0
+        self.wrapped = False
+
+def _prune_dead_buffers():
+    """Forget buffers of threads that have exited (call with _buffers_lock held)"""
+    _buffers[:] = [buf for buf in _buffers if buf.thread.is_alive()]
+
+def _buffer():
+    try:
+        return _local.buffer
+    except AttributeError:
+        buf = _local.buffer = _ThreadBuffer()
+        with _buffers_lock:
+            _buffers.append(buf)
+        return buf
+
+class _Span:
+    __slots__ = ("name", "detail", "start")
+
+    def __init__(self, name, detail):
+        self.name = name
+        self.detail = detail
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        buf = _buffer()
+        buf.events[buf.index] = (self.name, self.start, end - self.start, self.detail)
+        buf.index += 1
+        if buf.index == TRACE_BUFFER_SIZE:
+            buf.index = 0
+            buf.wrapped = True
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name, detail=None):
+    """Time a block: `with span("read_sensor", name): ...`. A shared no-op when tracing is off."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, detail)
+
+class TracedLock:
+    """Lock wrapper that records how long each acquisition waited when tracing is on"""
+    __slots__ = ("_lock", "_name")
+
+    def __init__(self, name="lock"):
+        self._lock = threading.Lock()
+        self._name = name
+
+    def __enter__(self):
+        if not _enabled:
+            self._lock.acquire()
+            return self
+        with _Span(self._name, None):
+            self._lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+        return False
+
+    def acquire(self, *args, **kwargs):
+        return self._lock.acquire(*args, **kwargs)
+
+    def release(self):
+        self._lock.release()
+
+def is_enabled():
+    return _enabled
+
+def enable():
+    """Start recording spans, discarding anything recorded earlier"""
+    global _enabled
+    with _buffers_lock:
+        _prune_dead_buffers()
+        for buf in _buffers:
+            buf.clear()
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def dump(path=None):
+    """Write all recorded spans as a Chrome/Perfetto trace (JSON) and return the path.
+
+    Spans of threads that have since exited are written once, then their
+    buffers are released.
+    """
+    if path is None:
+        path = f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+
+    pid = os.getpid()
+    events = []
+    with _buffers_lock:
+        buffers = list(_buffers)
+        _prune_dead_buffers()
+
+    for buf in buffers:
+        events.append({
+            "name": "thread_name", "ph": "M", "pid": pid, "tid": buf.tid,
+            "args": {"name": buf.thread_name}
+        })
+        recorded = buf.events if buf.wrapped else buf.events[:buf.index]
+        for event in recorded:
+            if event is None:
+                continue
+            name, start, duration, detail = event
+            record = {
+                "name": name, "ph": "X", "pid": pid, "tid": buf.tid,
+                "ts": (start - _origin) / 1000, "dur": duration / 1000
+            }
+            if detail is not None:
+                record["args"] = {"detail": detail}
+            events.append(record)
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return path
+
+def install_signal_handler(signum=TRACE_SIGNAL):
+    """Dump a trace when the process receives signum (SIGUSR1 by default, main thread only)"""
+    if signum is None:
+        return
+    signal.signal(signum, lambda *args: threading.Thread(target=dump, daemon=True).start())